@@ -1,13 +1,44 @@
-import json
+import asyncio
+import contextlib
+import copy
+import functools
+import hashlib
 import logging
 import re
+import fastjsonschema
+import orjson
 import tiktoken
-from typing import Any, Dict, Optional
-from jsonschema import validate, ValidationError
-from openai import OpenAI
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from openai import APIError, APIResponseValidationError, APIStatusError, AsyncOpenAI, OpenAI
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
+
+# Compiled validators keyed by id(schema); the schema itself is kept alongside
+# so its id cannot be reused by another object while the entry is alive.
+_COMPILED: Dict[int, tuple[dict, Callable[[Any], Any]]] = {}
+# Serialized schemas for extraction prompts, keyed the same way.
+_SCHEMA_JSON_CACHE: Dict[int, tuple[dict, str]] = {}
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.MULTILINE)
+_FENCE_OPEN_RE = re.compile(r"```(?:json)?\s*")
+_NUMBERED_LINE_RE = re.compile(r"^\s*(\d+)\s*[.):-]?\s*(.*?)\s*$")
+
+# Upper bound on documents processed concurrently by extract_batch.
+_MAX_CONCURRENCY = 5
+
+# Default token budget for extraction prompts.
+_MAX_PROMPT_TOKENS = 6000
+
+# In-process caches of LLM results: classification is keyed by a hash of (model, prompt),
+# extraction by a hash of (model, schema, document text, token budget).
+# Only successful results are stored: valid schema_ids, and extractions once extract has validated them.
+_CACHE_MAXSIZE = 1024
+_CLASSIFY_CACHE: Dict[str, str] = {}
+_EXTRACT_CACHE: Dict[str, dict] = {}
+_CACHE_STATS = {
+    "classification": {"hits": 0, "misses": 0},
+    "extraction": {"hits": 0, "misses": 0},
+}
 
 
 class ExtractionError(Exception): pass
@@ -17,43 +48,141 @@ class ParseError(ExtractionError): pass
 class SchemaValidationError(ExtractionError): pass
 
 
+@functools.lru_cache(maxsize=32)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    """
+    Return the tiktoken encoding for a model, cached so it is only built once per process.
+    """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
 def count_tokens(text: str, model: str) -> int:
     """
     Return number of tokens for a given text and model using tiktoken.
+    Special-token text such as "<|endoftext|>" is counted as ordinary text.
+    """
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+
+def _token_usage(usage: Any, prompt: str, raw_output: str, model: str) -> tuple[int, int]:
+    """
+    Return (prompt_tokens, response_tokens), preferring the counts reported by the API
+    and only tokenizing locally when the response carries no usage.
+    """
+    if usage is not None:
+        return usage.input_tokens, usage.output_tokens
+    return count_tokens(prompt, model), count_tokens(raw_output, model)
+
+
+def _cache_key(prompt: str, model: str) -> str:
+    return hashlib.blake2b(f"{model}\0{prompt}".encode(), digest_size=16).hexdigest()
+
+
+def _cache_get(stage: str, cache: Dict[str, Any], key: str, metrics: dict | None) -> Any:
+    value = cache.get(key)
+    if value is None:
+        _CACHE_STATS[stage]["misses"] += 1
+        return None
+
+    _CACHE_STATS[stage]["hits"] += 1
+    logger.info("%s cache hit.", stage.capitalize())
+    if metrics is not None:
+        metrics[f"{stage}_cache_hit"] = True
+        # Keep counts an earlier attempt of the same extract call already paid for.
+        metrics.setdefault(f"{stage}_prompt_tokens", 0)
+        metrics.setdefault(f"{stage}_response_tokens", 0)
+        metrics.setdefault(f"{stage}_total_tokens", 0)
+    return value
+
+
+def _cache_put(cache: Dict[str, Any], key: str, value: Any) -> None:
+    if key not in cache and len(cache) >= _CACHE_MAXSIZE:
+        cache.pop(next(iter(cache)))
+    cache[key] = value
+
+
+def cache_info() -> dict:
+    """
+    Return hit/miss counts and current size of the classification and extraction caches.
+    """
+    return {
+        "classification": {**_CACHE_STATS["classification"], "size": len(_CLASSIFY_CACHE)},
+        "extraction": {**_CACHE_STATS["extraction"], "size": len(_EXTRACT_CACHE)},
+    }
+
+
+def clear_cache() -> None:
+    """
+    Drop all cached LLM results and reset the hit/miss counters.
+    """
+    _CLASSIFY_CACHE.clear()
+    _EXTRACT_CACHE.clear()
+    for stats in _CACHE_STATS.values():
+        stats["hits"] = stats["misses"] = 0
+
+
+def _request_args(model: str, prompt: str, **extra: Any) -> dict:
+    """
+    Return the keyword arguments for llm.responses.create shared by every call.
+    """
+    return {"model": model, "input": prompt, "temperature": 0, **extra}
+
+
+def _is_transient(error: APIError) -> bool:
+    """
+    Return whether an API failure is worth retrying. 4xx responses other than 429 and
+    malformed responses fail the same way again; connection errors, timeouts, 429/5xx and
+    errors reported mid-stream (a bare APIError without a status) may not.
+    """
+    if isinstance(error, APIResponseValidationError):
+        return False
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+@contextlib.contextmanager
+def _model_call_errors() -> Iterator[None]:
+    """
+    Convert transient API failures raised inside the block into ModelCallError.
     """
     try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
+        yield
+    except APIError as e:
+        if not _is_transient(e):
+            raise
+        raise ModelCallError(f"LLM call failed: {e}")
 
 
-def classify_document(text: str, registry: Dict[str, dict], llm: OpenAI, model: str, metrics: dict | None = None) -> str:
+def _chunked(texts: List[str], size: int) -> List[List[str]]:
+    return [texts[start:start + size] for start in range(0, len(texts), size)]
+
+
+def _classification_window(text: str) -> str:
     """
-    Use OpenAI API to classify which schema applies, based on document text.
-    Returns the schema_id.
+    Return the head and tail of the document that classification prompts are built from.
     """
-    prompt = (
+    return text[:200] + text[-200:]
+
+
+def _build_classification_prompt(text: str, registry: Dict[str, dict]) -> str:
+    # Stable instructions first and document text last, so the prompt prefix can be cached by the API.
+    return (
         "You are given document text and a set of available schema IDs. "
         f"Schema IDs: {list(registry.keys())}\n"
-        f"Document text: {text[:200] + text[-200:]}...\n"
-        "Which schema_id best matches this document? Respond with only the schema_id."
+        "Which schema_id best matches this document? Respond with only the schema_id.\n"
+        f"Document text: {_classification_window(text)}..."
     )
 
-    logger.info(f"Classification started.")
-    prompt_tokens = count_tokens(prompt, model)
-    if metrics is not None:
-        metrics["classification_prompt_tokens"] = prompt_tokens
-
-    response = llm.responses.create(
-        model=model,
-        input=prompt,
-        temperature=0,
-    )
 
+def _parse_classification(response: Any, registry: Dict[str, dict], prompt: str, model: str, metrics: dict | None) -> str:
     raw_output = getattr(response, "output_text", "")
-    response_tokens = count_tokens(raw_output, model)
+    prompt_tokens, response_tokens = _token_usage(getattr(response, "usage", None), prompt, raw_output, model)
     if metrics is not None:
+        metrics["classification_prompt_tokens"] = prompt_tokens
         metrics["classification_response_tokens"] = response_tokens
         metrics["classification_total_tokens"] = prompt_tokens + response_tokens
 
@@ -62,74 +191,470 @@ def classify_document(text: str, registry: Dict[str, dict], llm: OpenAI, model:
     if schema_id not in registry:
         raise ExtractionError(f"Classification failed. Unknown schema_id: {schema_id}")
     
-    logger.info(f"Classification successful. Schema chosen: {schema_id}")
+    logger.info("Classification successful. Schema chosen: %s", schema_id)
     return schema_id
 
 
+def _prepare_classification(text: str, registry: Dict[str, dict], model: str, metrics: dict | None) -> tuple[Optional[str], str, str]:
+    """
+    Return (cached schema_id or None, prompt, cache key) for a classification call.
+    """
+    prompt = _build_classification_prompt(text, registry)
+    key = _cache_key(prompt, model)
+    cached = _cache_get("classification", _CLASSIFY_CACHE, key, metrics)
+    if cached is None:
+        logger.info("Classification started.")
+    return cached, prompt, key
+
+
+def _finish_classification(response: Any, registry: Dict[str, dict], prompt: str, key: str, model: str, metrics: dict | None) -> str:
+    schema_id = _parse_classification(response, registry, prompt, model, metrics)
+    _cache_put(_CLASSIFY_CACHE, key, schema_id)
+    return schema_id
+
+
+def classify_document(text: str, registry: Dict[str, dict], llm: OpenAI, model: str, metrics: dict | None = None) -> str:
+    """
+    Use OpenAI API to classify which schema applies, based on document text.
+    Returns the schema_id.
+    """
+    cached, prompt, key = _prepare_classification(text, registry, model, metrics)
+    if cached is not None:
+        return cached
+
+    with _model_call_errors():
+        response = llm.responses.create(**_request_args(model, prompt))
+
+    return _finish_classification(response, registry, prompt, key, model, metrics)
+
+
+async def classify_document_async(text: str, registry: Dict[str, dict], llm: AsyncOpenAI, model: str, metrics: dict | None = None) -> str:
+    """
+    Async variant of classify_document for use with AsyncOpenAI.
+    """
+    cached, prompt, key = _prepare_classification(text, registry, model, metrics)
+    if cached is not None:
+        return cached
+
+    with _model_call_errors():
+        response = await llm.responses.create(**_request_args(model, prompt))
+
+    return _finish_classification(response, registry, prompt, key, model, metrics)
+
+
+def _build_batch_classification_prompt(texts: List[str], registry: Dict[str, dict]) -> str:
+    documents = "\n".join(f"{i}. {_classification_window(text)}..." for i, text in enumerate(texts, start=1))
+    return (
+        "You are given several numbered documents and a set of available schema IDs. "
+        f"Schema IDs: {list(registry.keys())}\n"
+        "Classify each of the following documents. Reply with one line per document "
+        "in the form '<number>. <schema_id>' and nothing else.\n"
+        f"{documents}"
+    )
+
+
+def _parse_batch_classification(
+    response: Any,
+    texts: List[str],
+    registry: Dict[str, dict],
+    prompt: str,
+    model: str,
+    metrics: dict | None,
+) -> List[str]:
+    raw_output = getattr(response, "output_text", "")
+    prompt_tokens, response_tokens = _token_usage(getattr(response, "usage", None), prompt, raw_output, model)
+    if metrics is not None:
+        metrics["classification_batches"] = metrics.get("classification_batches", 0) + 1
+        metrics["classification_prompt_tokens"] = metrics.get("classification_prompt_tokens", 0) + prompt_tokens
+        metrics["classification_response_tokens"] = metrics.get("classification_response_tokens", 0) + response_tokens
+        metrics["classification_total_tokens"] = metrics.get("classification_total_tokens", 0) + prompt_tokens + response_tokens
+
+    labels: Dict[int, str] = {}
+    for line in raw_output.splitlines():
+        match = _NUMBERED_LINE_RE.match(line)
+        if match:
+            labels[int(match.group(1))] = match.group(2)
+
+    schema_ids = []
+    for i in range(1, len(texts) + 1):
+        schema_id = labels.get(i)
+        if schema_id not in registry:
+            raise ClassificationError(f"Batch classification failed. Unknown schema_id for document {i}: {schema_id}")
+        schema_ids.append(schema_id)
+
+    logger.info("Batch classification successful. Schemas chosen: %s", schema_ids)
+    return schema_ids
+
+
+def classify_documents(
+    texts: List[str],
+    registry: Dict[str, dict],
+    llm: OpenAI,
+    model: str,
+    batch_size: int = 8,
+    metrics: dict | None = None,
+) -> List[str]:
+    """
+    Classify many documents with one LLM call per batch of up to batch_size documents.
+    Returns the schema_ids in input order.
+    """
+    schema_ids = []
+    for chunk in _chunked(texts, batch_size):
+        prompt = _build_batch_classification_prompt(chunk, registry)
+        logger.info("Batch classification started for %d documents.", len(chunk))
+        with _model_call_errors():
+            response = llm.responses.create(**_request_args(model, prompt))
+        schema_ids.extend(_parse_batch_classification(response, chunk, registry, prompt, model, metrics))
+    return schema_ids
+
+
+async def classify_documents_async(
+    texts: List[str],
+    registry: Dict[str, dict],
+    llm: AsyncOpenAI,
+    model: str,
+    batch_size: int = 8,
+    metrics: dict | None = None,
+) -> List[str]:
+    """
+    Async variant of classify_documents; batches are sent concurrently.
+    """
+    async def _classify_chunk(chunk: List[str]) -> List[str]:
+        prompt = _build_batch_classification_prompt(chunk, registry)
+        logger.info("Batch classification started for %d documents.", len(chunk))
+        with _model_call_errors():
+            response = await llm.responses.create(**_request_args(model, prompt))
+        return _parse_batch_classification(response, chunk, registry, prompt, model, metrics)
+
+    results = await asyncio.gather(*(_classify_chunk(chunk) for chunk in _chunked(texts, batch_size)))
+    return [schema_id for chunk_ids in results for schema_id in chunk_ids]
+
+
 def _clean_json_output(raw: str) -> str:
     """
     Remove common Markdown fences (```json ... ``` or ``` ... ```) 
     and trim whitespace.
     """
-    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw.strip(), flags=re.MULTILINE)
-    return cleaned.strip()
+    cleaned = raw.strip()
+    if "```" not in cleaned:
+        return cleaned
+    # The fence patterns consume the whitespace next to them, so no second strip is needed.
+    return _FENCE_RE.sub("", cleaned)
 
 
-def call_llm_extract(text: str, schema: dict, llm: OpenAI, model: str = "gpt-4o-mini", metrics: dict | None = None) -> dict:
+def _schema_json(schema: dict) -> str:
     """
-    Ask LLM to extract structured JSON given a schema.
+    Return the compact serialized schema used in extraction prompts, serializing each schema once.
     """
-    prompt = f"""
-        You are an information extraction engine.
-        Extract the required fields from this document text.
+    entry = _SCHEMA_JSON_CACHE.get(id(schema))
+    if entry is None:
+        entry = _SCHEMA_JSON_CACHE.setdefault(id(schema), (schema, orjson.dumps(schema).decode()))
+    return entry[1]
 
-        Document text: {text}
+
+def _build_extraction_prompt(text: str, schema: dict) -> str:
+    # Instructions and schema form a stable prefix shared by every document of the same type
+    # (and by retries), which lets the API reuse its prompt cache. Document text goes last.
+    return f"""
+        You are an information extraction engine.
+        Extract the required fields from the document text below.
 
         Output JSON MUST strictly conform to this JSON Schema:
-        {json.dumps(schema, indent=2)}
+        {_schema_json(schema)}
+
+        Document text: {text}
         """.strip()
 
-    logger.info(f"Extraction started.")
-    prompt_tokens = count_tokens(prompt, model)
+
+def _fit_to_token_budget(text: str, schema: dict, model: str, max_prompt_tokens: int) -> str:
+    """
+    Trim document text to its head and tail so the extraction prompt stays within max_prompt_tokens.
+    """
+    prefix = _build_extraction_prompt("", schema)
+    # A token covers at least one byte, so prompts this short cannot exceed the budget
+    # and need no tokenization at all.
+    if len(prefix.encode()) + len(text.encode()) <= max_prompt_tokens:
+        return text
+
+    encoding = _get_encoding(model)
+    # Documents may contain special-token text such as "<|endoftext|>"; encode it as plain text.
+    tokens = encoding.encode(text, disallowed_special=())
+    # One extra token for the space that separates the prefix from the document text.
+    budget = max_prompt_tokens - len(encoding.encode(prefix, disallowed_special=())) - 1
+    if len(tokens) <= budget:
+        return text
+
+    marker = encoding.encode("\n...\n", disallowed_special=())
+    budget = max(budget - len(marker), 0)
+    head = budget // 2
+    tail = budget - head
+    logger.info("Document truncated from %d to %d tokens.", len(tokens), budget)
+    return encoding.decode(tokens[:head] + marker + tokens[len(tokens) - tail:])
+
+
+class _JsonObjectScanner:
+    """
+    Accumulate streamed LLM output and parse the top-level JSON object as soon as it closes.
+    A leading Markdown fence is allowed; anything else before the opening brace marks the
+    output as unparseable so the stream can be abandoned early.
+    """
+
+    def __init__(self) -> None:
+        self.text = ""
+        self.data: Any = None
+        self.error: Optional[Exception] = None
+        self.done = False
+        self._start: Optional[int] = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def feed(self, chunk: str) -> None:
+        self.text += chunk
+        if self.done or self.failed:
+            return
+        if self._start is None and not self._find_start():
+            return
+        self._scan()
+
+    def _find_start(self) -> bool:
+        head = self.text.lstrip()
+        if "```json".startswith(head):
+            return False
+        offset = len(self.text) - len(head)
+        fence = _FENCE_OPEN_RE.match(head)
+        if fence:
+            offset += fence.end()
+            head = head[fence.end():]
+            if not head:
+                return False
+        if head[0] != "{":
+            self.error = ValueError(f"Expected a JSON object, got {head[:20]!r}")
+            return False
+        self._start = self._pos = offset
+        return True
+
+    def _scan(self) -> None:
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+                    try:
+                        self.data = orjson.loads(text[self._start:i + 1])
+                    except orjson.JSONDecodeError as e:
+                        self.error = e
+                    return
+        self._pos = len(text)
+
+
+def _handle_stream_event(event: Any, scanner: _JsonObjectScanner) -> Any:
+    """
+    Feed a streaming event into the scanner. Returns the usage object on the completion event.
+    """
+    event_type = getattr(event, "type", None)
+    if event_type == "response.output_text.delta":
+        scanner.feed(event.delta)
+    elif event_type == "response.completed":
+        return getattr(event.response, "usage", None)
+    return None
+
+
+def _parse_extraction(scanner: _JsonObjectScanner, usage: Any, prompt: str, model: str, metrics: dict | None) -> dict:
+    raw_output = scanner.text
+    prompt_tokens, response_tokens = _token_usage(usage, prompt, raw_output, model)
     if metrics is not None:
         metrics["extraction_prompt_tokens"] = prompt_tokens
+        metrics["extraction_response_tokens"] = response_tokens
+        metrics["extraction_total_tokens"] = prompt_tokens + response_tokens
 
     try:
-        response = llm.responses.create(
-            model=model,
-            input=prompt,
-            temperature=0,
-        )
-    except Exception as e:
-        raise ModelCallError(f"LLM call failed: {e}")
-
-    try:
-        raw_output = getattr(response, "output_text", "")
-        response_tokens = count_tokens(raw_output, model)
-        if metrics is not None:
-            metrics["extraction_response_tokens"] = response_tokens
-            metrics["extraction_total_tokens"] = prompt_tokens + response_tokens
-
-        cleaned_output = _clean_json_output(raw_output.strip())
-        data = json.loads(cleaned_output)
-    except Exception as e:
+        if scanner.failed:
+            raise scanner.error
+        if scanner.done:
+            data = scanner.data
+        else:
+            data = orjson.loads(_clean_json_output(raw_output))
+    except ValueError as e:
         raise ParseError(f"Could not parse LLM output as JSON: {e}\nRaw output: {raw_output}")
     
-    logger.info(f"Extraction successful.")
+    logger.info("Extraction successful.")
 
     return data
 
 
+def _extraction_cache_key(text: str, schema: dict, model: str, max_prompt_tokens: int) -> str:
+    # The extraction prompt is fully determined by these inputs, so the lookup can run
+    # before any truncation work.
+    return _cache_key(f"{max_prompt_tokens}\0{_schema_json(schema)}\0{text}", model)
+
+
+def _remember_extraction(text: str, schema: dict, model: str, data: dict) -> None:
+    # Called by extract only after validation: caching output that fails validation
+    # would make every retry replay the same bad answer.
+    key = _extraction_cache_key(text, schema, model, _MAX_PROMPT_TOKENS)
+    _cache_put(_EXTRACT_CACHE, key, copy.deepcopy(data))
+
+
+def _prepare_extraction(text: str, schema: dict, model: str, max_prompt_tokens: int, metrics: dict | None) -> tuple[Optional[dict], str]:
+    """
+    Return (cached extraction or None, prompt) for an extraction call.
+    """
+    cached = _cache_get("extraction", _EXTRACT_CACHE, _extraction_cache_key(text, schema, model, max_prompt_tokens), metrics)
+    if cached is not None:
+        return copy.deepcopy(cached), ""
+
+    logger.info("Extraction started.")
+    text = _fit_to_token_budget(text, schema, model, max_prompt_tokens)
+    return None, _build_extraction_prompt(text, schema)
+
+
+def call_llm_extract(
+    text: str,
+    schema: dict,
+    llm: OpenAI,
+    model: str = "gpt-4o-mini",
+    metrics: dict | None = None,
+    max_prompt_tokens: int = _MAX_PROMPT_TOKENS,
+) -> dict:
+    """
+    Ask LLM to extract structured JSON given a schema.
+    Documents that would push the prompt past max_prompt_tokens keep only their head and tail.
+    """
+    cached, prompt = _prepare_extraction(text, schema, model, max_prompt_tokens, metrics)
+    if cached is not None:
+        return cached
+
+    scanner = _JsonObjectScanner()
+    usage = None
+    with _model_call_errors():
+        stream = llm.responses.create(**_request_args(model, prompt, stream=True))
+        for event in stream:
+            usage = _handle_stream_event(event, scanner) or usage
+            if scanner.failed:
+                # The output can no longer parse; stop paying for the remaining tokens.
+                stream.close()
+                break
+
+    return _parse_extraction(scanner, usage, prompt, model, metrics)
+
+
+async def call_llm_extract_async(
+    text: str,
+    schema: dict,
+    llm: AsyncOpenAI,
+    model: str = "gpt-4o-mini",
+    metrics: dict | None = None,
+    max_prompt_tokens: int = _MAX_PROMPT_TOKENS,
+) -> dict:
+    """
+    Async variant of call_llm_extract for use with AsyncOpenAI.
+    """
+    cached, prompt = _prepare_extraction(text, schema, model, max_prompt_tokens, metrics)
+    if cached is not None:
+        return cached
+
+    scanner = _JsonObjectScanner()
+    usage = None
+    with _model_call_errors():
+        stream = await llm.responses.create(**_request_args(model, prompt, stream=True))
+        async for event in stream:
+            usage = _handle_stream_event(event, scanner) or usage
+            if scanner.failed:
+                # The output can no longer parse; stop paying for the remaining tokens.
+                await stream.close()
+                break
+
+    return _parse_extraction(scanner, usage, prompt, model, metrics)
+
+
+def compile_schema(schema: dict) -> Callable[[Any], Any]:
+    """
+    Return a compiled validator for the schema, compiling it on first use only.
+    """
+    entry = _COMPILED.get(id(schema))
+    if entry is None:
+        entry = _COMPILED.setdefault(id(schema), (schema, fastjsonschema.compile(schema)))
+    return entry[1]
+
+
 def validate_against_schema(data: dict, schema: dict) -> None:
     """
     Validate JSON against given schema.
     """
+    validator = compile_schema(schema)
     try:
-        validate(instance=data, schema=schema)
-    except ValidationError as e:
+        validator(data)
+    except fastjsonschema.JsonSchemaValueException as e:
         raise SchemaValidationError(f"Schema validation failed: {e.message}")
     
-    logger.info(f"Validation successful.")
+    logger.info("Validation successful.")
+
+
+class _AttemptLog:
+    """
+    Attempt and error bookkeeping shared by extract and extract_async.
+    """
+
+    def __init__(self) -> None:
+        self.attempts: List[dict] = []
+        self.last_error: Optional[Exception] = None
+
+    def record(self, stage: str, schema_id: Optional[str], error: Exception) -> None:
+        self.last_error = error
+        self.attempts.append({"stage": stage, "schema": schema_id, "error": str(error)})
+
+    def failure(self) -> ExtractionError:
+        return ExtractionError({
+            "message": "Extraction failed after 2 attempts.",
+            "attempts": self.attempts,
+            "last_error": str(self.last_error),
+        })
+
+
+def _preselected_schema(schema: Optional[dict], registry: Dict[str, dict], metrics: dict) -> Optional[tuple[str, dict]]:
+    """
+    Return (schema_id, schema) when no classification call is needed, otherwise None.
+    """
+    if schema is not None:
+        return schema.get("$id", "unknown"), schema
+    if len(registry) == 1:
+        # Only one candidate: no need to ask the model.
+        metrics["classification_total_tokens"] = 0
+        return next(iter(registry.items()))
+    return None
+
+
+def _validated_result(text: str, schema_id: str, schema: dict, extracted: dict, model: str, metrics: dict) -> dict:
+    """
+    Validate the extraction and build the pipeline result. Raises SchemaValidationError.
+    """
+    validate_against_schema(extracted, schema)
+    _remember_extraction(text, schema, model, extracted)
+    return {
+        "doc_type": schema_id,
+        "schema_version": schema.get("version"),
+        "data": extracted,
+        "metrics": metrics,
+    }
 
 
 def extract(
@@ -142,53 +667,131 @@ def extract(
     """
     End-to-end pipeline.
     """
-    attempts = []
-    last_error: Optional[Exception] = None
+    log = _AttemptLog()
     metrics = {}
 
     for attempt in range(2):
-        logger.info(f"Attempt {attempt+1}")
+        logger.info("Attempt %d", attempt + 1)
 
         try:
-            if schema is not None:
-                schema_id = schema.get("$id", "unknown")
-                selected_schema = schema
-            else:
+            selected = _preselected_schema(schema, registry, metrics)
+            if selected is None:
                 schema_id = classify_document(text, registry, llm, model, metrics)
-                selected_schema = registry[schema_id]
-        except Exception as e:
-            last_error = e
-            attempts.append({"stage": "classify", "schema": None, "error": str(e)})
+                selected = schema_id, registry[schema_id]
+        except ExtractionError as e:
+            log.record("classify", None, e)
             continue
-
-        schema_version = selected_schema.get("version")
+        schema_id, selected_schema = selected
 
         try:
             extracted = call_llm_extract(text, selected_schema, llm, model=model, metrics=metrics)
         except ExtractionError as e:
-            last_error = e
-            attempts.append({"stage": "extract", "schema": schema_id, "error": str(e)})
+            log.record("extract", schema_id, e)
             continue
 
         try:
-            validate_against_schema(extracted, selected_schema)
+            return _validated_result(text, schema_id, selected_schema, extracted, model, metrics)
         except SchemaValidationError as e:
-            last_error = e
-            attempts.append({"stage": "validate", "schema": schema_id, "error": str(e)})
-            if attempt == 0:
-                continue
-            else:
-                break
+            log.record("validate", schema_id, e)
 
-        return {
-            "doc_type": schema_id,
-            "schema_version": schema_version,
-            "data": extracted,
-            "metrics": metrics,
+    raise log.failure()
+
+
+async def extract_async(
+    text: str,
+    registry: Dict[str, dict],
+    llm: AsyncOpenAI,
+    schema: Optional[dict] = None,
+    model: str = "gpt-4o-mini",
+) -> dict:
+    """
+    Async variant of extract for use with AsyncOpenAI.
+    """
+    log = _AttemptLog()
+    metrics = {}
+
+    for attempt in range(2):
+        logger.info("Attempt %d", attempt + 1)
+
+        try:
+            selected = _preselected_schema(schema, registry, metrics)
+            if selected is None:
+                schema_id = await classify_document_async(text, registry, llm, model, metrics)
+                selected = schema_id, registry[schema_id]
+        except ExtractionError as e:
+            log.record("classify", None, e)
+            continue
+        schema_id, selected_schema = selected
+
+        try:
+            extracted = await call_llm_extract_async(text, selected_schema, llm, model=model, metrics=metrics)
+        except ExtractionError as e:
+            log.record("extract", schema_id, e)
+            continue
+
+        try:
+            return _validated_result(text, schema_id, selected_schema, extracted, model, metrics)
+        except SchemaValidationError as e:
+            log.record("validate", schema_id, e)
+
+    raise log.failure()
+
+
+async def extract_batch(
+    texts: List[str],
+    registry: Dict[str, dict],
+    llm: AsyncOpenAI,
+    model: str = "gpt-4o-mini",
+    max_concurrency: int = _MAX_CONCURRENCY,
+    classification_batch_size: int = 8,
+) -> List[dict | ExtractionError | APIError]:
+    """
+    Run extract_async over many documents concurrently.
+    Documents are first classified in batches of classification_batch_size; a batch whose
+    classification fails falls back to per-document classification inside extract_async.
+    Results are returned in input order; failed documents yield their ExtractionError or
+    non-retryable APIError instead of aborting the batch. Any other exception is re-raised.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _classify_chunk(chunk: List[str]) -> tuple[List[Optional[str]], dict]:
+        batch_metrics = {}
+        async with semaphore:
+            try:
+                schema_ids = await classify_documents_async(
+                    chunk, registry, llm, model, batch_size=len(chunk), metrics=batch_metrics
+                )
+            except (ExtractionError, APIError) as e:
+                logger.info("Batch classification failed, classifying documents one by one: %s", e)
+                return [None] * len(chunk), {}
+
+        # The batch's token usage is shared by every document in it.
+        return schema_ids, {
+            "classification_batch_size": len(chunk),
+            "classification_batch_prompt_tokens": batch_metrics["classification_prompt_tokens"],
+            "classification_batch_response_tokens": batch_metrics["classification_response_tokens"],
+            "classification_batch_total_tokens": batch_metrics["classification_total_tokens"],
         }
 
-    raise ExtractionError({
-        "message": "Extraction failed after 2 attempts.",
-        "attempts": attempts,
-        "last_error": str(last_error),
-    })
+    async def _bounded(text: str, schema_id: Optional[str], batch_metrics: dict) -> dict:
+        async with semaphore:
+            schema = registry[schema_id] if schema_id is not None else None
+            result = await extract_async(text, registry, llm, schema=schema, model=model)
+        result["metrics"].update(batch_metrics)
+        return result
+
+    chunks = _chunked(texts, classification_batch_size)
+    if len(registry) == 1:
+        classified = [([None] * len(chunk), {}) for chunk in chunks]
+    else:
+        classified = await asyncio.gather(*(_classify_chunk(chunk) for chunk in chunks))
+
+    jobs = []
+    for chunk, (schema_ids, batch_metrics) in zip(chunks, classified):
+        jobs.extend(_bounded(text, schema_id, batch_metrics) for text, schema_id in zip(chunk, schema_ids))
+
+    results = await asyncio.gather(*jobs, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(result, (ExtractionError, APIError)):
+            raise result
+    return results
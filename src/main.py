@@ -1,20 +1,32 @@
+import asyncio
+import logging
 import os
-import json
 import pathlib
+import httpx
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai import OpenAI
-from extractor import extract
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from extractor import compile_schema, extract_batch
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
+
+
+def _load_schema(path: pathlib.Path) -> dict:
+    with open(path, "rb") as f:
+        schema = orjson.loads(f.read())
+    compile_schema(schema)
+    return schema
+
 
 # Load registry
-registry = {}
-for path in pathlib.Path("schemas").glob("*.json"):
-    with open(path) as f:
-        schema = json.load(f)
-        registry[schema["$id"]] = schema
+with ThreadPoolExecutor() as executor:
+    schemas = list(executor.map(_load_schema, pathlib.Path("schemas").glob("*.json")))
+registry = {schema["$id"]: schema for schema in schemas}
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# httpx logs every request at INFO; keep only warnings from the transport.
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 text = ("This W-2 Wage and Tax Statement for the year 2016 reports the following information:"
         "Wages, tips, other compensation: $10,415.00 Federal Income tax withheld: $900.00"
@@ -26,5 +38,29 @@ text = ("This W-2 Wage and Tax Statement for the year 2016 reports the following
         "Third-Party Sick pay: Not checked  Employee: Sparty Jones, 123 Spartan Blvd, East Lansing MI 48823"
         "State: MI  State wages, tips, etc.: $10,415.00  Employer's state ID: 690350502  State income tax: $442.00")
 
-result = extract(text, registry, llm=client)
-print(json.dumps(result, indent=2))
+texts = [text]
+
+
+async def main() -> None:
+    # One pooled HTTP/2 connection set is reused for every classification and extraction call,
+    # and closed with the client once the batch is done.
+    client = AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        max_retries=2,
+        http_client=DefaultAsyncHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=20),
+        ),
+    )
+    async with client:
+        results = await extract_batch(texts, registry, llm=client)
+
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Extraction failed: {result}")
+        else:
+            print(orjson.dumps(result, option=orjson.OPT_INDENT_2, default=str).decode())
+
+
+asyncio.run(main())
@@ -1,37 +1,122 @@
+import asyncio
 import json
+import threading
+import httpx
+import openai
+import types
 import pytest
+import src.extractor
 from src.extractor import (
     extract,
     ExtractionError,
     ParseError,
     SchemaValidationError,
+    cache_info,
+    call_llm_extract,
     classify_document,
+    classify_documents,
+    clear_cache,
+    extract_async,
+    extract_batch,
 )
 
 
 class FakeResponse:
-    def __init__(self, text: str):
+    def __init__(self, text: str, prompt: str = ""):
         self.output_text = text
+        # Word counts stand in for the token usage the API reports.
+        self.usage = types.SimpleNamespace(input_tokens=len(prompt.split()), output_tokens=len(text.split()))
+
+class FakeStreamEvent:
+    def __init__(self, type: str, **fields):
+        self.type = type
+        self.__dict__.update(fields)
+
+class FakeStream:
+    """Mimics the event stream returned by responses.create(..., stream=True)"""
+    def __init__(self, text: str, prompt: str = "", chunk_size: int = 8, error: Exception | None = None):
+        self._error = error
+        self._events = [
+            FakeStreamEvent("response.output_text.delta", delta=text[i:i + chunk_size])
+            for i in range(0, len(text), chunk_size)
+        ]
+        self._events.append(FakeStreamEvent("response.completed", response=FakeResponse(text, prompt)))
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for event in self._events:
+            if self.closed:
+                return
+            self.consumed += 1
+            yield event
+            if self._error is not None:
+                raise self._error
+
+    def close(self):
+        self.closed = True
+
+class FakeAsyncStream(FakeStream):
+    async def __aiter__(self):
+        for event in FakeStream.__iter__(self):
+            yield event
+
+    async def close(self):
+        FakeStream.close(self)
+
+class MidStreamError:
+    """Queued response whose stream fails with the given error after the first event."""
+    def __init__(self, error: Exception):
+        self.error = error
 
 class FakeClient:
     """Fake OpenAI client to mimic responses.create(...)"""
+    stream_class = FakeStream
+
     def __init__(self, responses):
-        if isinstance(responses, list):
-            self._responses = responses
-        else:
-            self._responses = [responses]
+        if not isinstance(responses, list):
+            responses = [responses]
+        self._responses = iter(responses)
+        self._lock = threading.Lock()
         self.calls = 0
+        self.inputs = []
 
     @property
     def responses(self):
         return self
 
     def create(self, *args, **kwargs):
-        if self.calls >= len(self._responses):
-            raise RuntimeError("No more fake responses available")
-        out = self._responses[self.calls]
-        self.calls += 1
-        return FakeResponse(out)
+        prompt = kwargs.get("input", "")
+        with self._lock:
+            try:
+                out = next(self._responses)
+            except StopIteration:
+                raise RuntimeError("No more fake responses available")
+            self.calls += 1
+            self.inputs.append(prompt)
+        if isinstance(out, Exception):
+            raise out
+        if isinstance(out, MidStreamError):
+            self.last_stream = self.stream_class("{", prompt, error=out.error)
+            return self.last_stream
+        if kwargs.get("stream"):
+            self.last_stream = self.stream_class(out, prompt)
+            return self.last_stream
+        return FakeResponse(out, prompt)
+
+class FakeAsyncClient(FakeClient):
+    """Fake AsyncOpenAI client to mimic await responses.create(...)"""
+    stream_class = FakeAsyncStream
+
+    async def create(self, *args, **kwargs):
+        return FakeClient.create(self, *args, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    clear_cache()
+    yield
+    clear_cache()
 
 
 @pytest.fixture
@@ -107,9 +192,18 @@ def test_extract_retry_then_success(registry):
     assert result["doc_type"] == "w2"
     assert llm_client.calls == 2
 
+def test_extract_single_schema_registry_skips_classification(registry):
+    single = {"1040": registry["1040"]}
+    llm_client = FakeClient(json.dumps({"taxpayer_name": "John", "income": 1000}))
+
+    result = extract("Some document", single, llm_client, model="fake")
+    assert result["doc_type"] == "1040"
+    assert result["metrics"]["classification_total_tokens"] == 0
+    assert llm_client.calls == 1
+
 def test_extract_classification_failure(registry):
     text = "Completely unrelated document"
-    llm_client = FakeClient("{}")
+    llm_client = FakeClient(["{}", "{}"])
 
     with pytest.raises(ExtractionError) as exc:
         extract(text, registry, llm_client, model="fake")
@@ -117,12 +211,96 @@ def test_extract_classification_failure(registry):
 
 def test_extract_parse_failure(registry):
     text = "This looks like a 1040 form"
-    llm_client = FakeClient("NOT JSON")
+    llm_client = FakeClient(["NOT JSON", "NOT JSON"])
 
     with pytest.raises(ExtractionError) as exc:
         extract(text, registry, llm_client, schema=registry["1040"], model="fake")
     assert "parse" in str(exc.value)
 
+def test_extract_parse_failure_stops_stream_early(registry):
+    text = "This looks like a 1040 form"
+    refusal = "Sorry, I cannot help with extracting this document."
+    llm_client = FakeClient([refusal, refusal])
+
+    with pytest.raises(ExtractionError):
+        extract(text, registry, llm_client, schema=registry["1040"], model="fake")
+    assert llm_client.last_stream.closed
+    assert llm_client.last_stream.consumed == 1
+
+def test_extract_ignores_text_after_json_object(registry):
+    text = "This looks like a 1040 form"
+    llm_client = FakeClient('{"taxpayer_name": "John {Jr}", "income": 1000}\nLet me know if you need more.')
+
+    result = extract(text, registry, llm_client, schema=registry["1040"], model="fake")
+    assert result["data"]["taxpayer_name"] == "John {Jr}"
+
+def test_extract_unexpected_error_is_not_retried(registry):
+    """Bugs surface immediately instead of being recorded as a failed attempt."""
+    llm_client = FakeClient([])
+
+    with pytest.raises(RuntimeError):
+        extract("This looks like a W2 form", registry, llm_client, model="fake")
+
+def test_call_llm_extract_truncates_long_document(registry):
+    text = "HEAD " + "filler " * 5000 + " TAIL"
+    llm_client = FakeClient(json.dumps({"taxpayer_name": "John", "income": 1000}))
+    metrics = {}
+
+    call_llm_extract(text, registry["1040"], llm_client, model="fake", metrics=metrics, max_prompt_tokens=1000)
+    prompt = llm_client.inputs[0]
+    assert "HEAD" in prompt and "TAIL" in prompt
+    assert len(prompt) < len(text)
+    assert src.extractor.count_tokens(prompt, "fake") <= 1000
+
+def test_call_llm_extract_truncates_document_with_special_tokens(registry, monkeypatch):
+    """Like tiktoken, the encoding rejects special-token text unless it is explicitly allowed."""
+    class StrictEncoding:
+        def encode(self, text, disallowed_special="all"):
+            if disallowed_special != () and "<|endoftext|>" in text:
+                raise ValueError("Encountered text corresponding to disallowed special token")
+            return list(text.encode())
+        def decode(self, tokens):
+            return bytes(tokens).decode(errors="ignore")
+
+    monkeypatch.setattr(src.extractor, "_get_encoding", lambda model: StrictEncoding())
+    text = "HEAD <|endoftext|> " + "filler " * 5000 + " TAIL"
+    llm_client = FakeClient(json.dumps({"taxpayer_name": "John", "income": 1000}))
+
+    call_llm_extract(text, registry["1040"], llm_client, model="fake", metrics={}, max_prompt_tokens=1000)
+    assert "<|endoftext|>" in llm_client.inputs[0]
+    assert src.extractor.count_tokens(llm_client.inputs[0], "fake") <= 1000
+
+def _api_error(cls, status):
+    response = httpx.Response(status, request=httpx.Request("POST", "https://api.openai.com/v1/responses"))
+    return cls(f"HTTP {status}", response=response, body=None)
+
+def test_extract_client_error_is_not_retried(registry):
+    """A 4xx fails the same way again, so it propagates instead of using the retry."""
+    llm_client = FakeClient([_api_error(openai.BadRequestError, 400), "{}"])
+
+    with pytest.raises(openai.BadRequestError):
+        extract("This looks like a 1040 form", registry, llm_client, schema=registry["1040"], model="fake")
+    assert llm_client.calls == 1
+
+def test_extract_transient_error_is_retried(registry):
+    good_json = json.dumps({"taxpayer_name": "John", "income": 1000})
+    llm_client = FakeClient([_api_error(openai.InternalServerError, 500), good_json])
+
+    result = extract("This looks like a 1040 form", registry, llm_client, schema=registry["1040"], model="fake")
+    assert result["data"]["income"] == 1000
+    assert llm_client.calls == 2
+
+def test_extract_mid_stream_error_is_retried(registry):
+    """A bare APIError from the SSE error event carries no status and counts as transient."""
+    request = httpx.Request("POST", "https://api.openai.com/v1/responses")
+    error = openai.APIError("An error occurred during streaming", request, body=None)
+    good_json = json.dumps({"taxpayer_name": "John", "income": 1000})
+    llm_client = FakeClient([MidStreamError(error), good_json])
+
+    result = extract("This looks like a 1040 form", registry, llm_client, schema=registry["1040"], model="fake")
+    assert result["data"]["income"] == 1000
+    assert llm_client.calls == 2
+
 def test_extract_schema_validation_failure(registry):
     text = "This looks like a 1040 form"
     bad_json = json.dumps({"taxpayer_name": "John"})
@@ -146,10 +324,135 @@ def test_classify_success_1040(registry):
     schema_id = classify_document(text, registry, client, model="fake")
     assert schema_id == "1040"
 
+def test_classify_uses_reported_usage(registry, monkeypatch):
+    """Token metrics come from response.usage without local tokenization."""
+    def fail(*args, **kwargs):
+        raise AssertionError("count_tokens should not be called")
+    monkeypatch.setattr(src.extractor, "count_tokens", fail)
+
+    client = FakeClient("w2")
+    metrics = {}
+    classify_document("This is a W2 document", registry, client, model="fake", metrics=metrics)
+    assert metrics["classification_prompt_tokens"] == len(client.inputs[0].split())
+    assert metrics["classification_response_tokens"] == 1
+
 def test_classify_unknown_schema(registry):
     """Raises error if LLM returns unknown schema_id."""
     client = FakeClient("unknown_schema")
     text = "Random text"
     with pytest.raises(ExtractionError) as exc:
         classify_document(text, registry, client, model="fake")
-    assert "Unknown schema_id" in str(exc.value)
\ No newline at end of file
+    assert "Unknown schema_id" in str(exc.value)
+
+def test_extract_repeat_document_served_from_cache(registry):
+    text = "This looks like a W2 form"
+    llm_client = FakeClient(["w2", json.dumps({
+        "employer_name": "Acme Corp",
+        "employee_name": "Jane Doe",
+        "wages": 50000
+    })])
+
+    first = extract(text, registry, llm_client, model="fake")
+    second = extract(text, registry, llm_client, model="fake")
+    assert first["data"] == second["data"]
+    assert llm_client.calls == 2
+    assert second["metrics"]["extraction_total_tokens"] == 0
+    assert second["metrics"]["classification_cache_hit"] is True
+    assert cache_info()["classification"]["hits"] == 1
+    assert cache_info()["extraction"]["hits"] == 1
+
+def test_extract_retry_cache_hit_keeps_paid_tokens(registry):
+    bad_json = json.dumps({"employer_name": "Acme Corp"})
+    good_json = json.dumps({
+        "employer_name": "Acme Corp",
+        "employee_name": "Jane Doe",
+        "wages": 50000
+    })
+    llm_client = FakeClient(["w2", bad_json, good_json])
+
+    result = extract("This looks like a W2 form", registry, llm_client, model="fake")
+    assert llm_client.calls == 3
+    assert result["metrics"]["classification_cache_hit"] is True
+    assert result["metrics"]["classification_total_tokens"] > 0
+
+def test_extract_validates_once_on_success(registry, monkeypatch):
+    calls = []
+    compile_schema = src.extractor.compile_schema
+    def counting_compile(schema):
+        calls.append(schema)
+        return compile_schema(schema)
+    monkeypatch.setattr(src.extractor, "compile_schema", counting_compile)
+
+    llm_client = FakeClient(json.dumps({"taxpayer_name": "John", "income": 1000}))
+    extract("This looks like a 1040 form", registry, llm_client, schema=registry["1040"], model="fake")
+    assert len(calls) == 1
+    assert cache_info()["extraction"]["size"] == 1
+
+def test_extract_invalid_output_not_cached(registry):
+    text = "This looks like a W2 form"
+    bad_json = json.dumps({"employer_name": "Acme Corp"})
+    good_json = json.dumps({
+        "employer_name": "Acme Corp",
+        "employee_name": "Jane Doe",
+        "wages": 50000
+    })
+    llm_client = FakeClient([bad_json, good_json])
+
+    result = extract(text, registry, llm_client, schema=registry["w2"], model="fake")
+    assert result["data"]["wages"] == 50000
+    assert cache_info()["extraction"]["hits"] == 0
+
+def test_extract_async_classify_then_extract(registry):
+    llm_client = FakeAsyncClient(["w2", json.dumps({
+        "employer_name": "Acme Corp",
+        "employee_name": "Jane Doe",
+        "wages": 50000
+    })])
+
+    result = asyncio.run(extract_async("This looks like a W2 form", registry, llm_client, model="fake"))
+    assert result["doc_type"] == "w2"
+    assert llm_client.calls == 2
+
+def test_extract_batch_keeps_order_and_collects_errors(registry):
+    good_json = json.dumps({"taxpayer_name": "John", "income": 1000})
+    bad_json = json.dumps({"employer_name": "Acme Corp"})
+    llm_client = FakeAsyncClient(["1. 1040\n2. w2", good_json, bad_json, bad_json])
+
+    results = asyncio.run(extract_batch(["1040 form", "W2 form"], registry, llm_client, model="fake", max_concurrency=1))
+    assert results[0]["doc_type"] == "1040"
+    assert results[0]["metrics"]["classification_batch_size"] == 2
+    assert isinstance(results[1], ExtractionError)
+    assert llm_client.calls == 4
+
+def test_extract_batch_collects_api_errors(registry):
+    """A document rejected by the API does not discard the other documents' results."""
+    good_json = json.dumps({"taxpayer_name": "John", "income": 1000})
+    rejected = _api_error(openai.BadRequestError, 400)
+    llm_client = FakeAsyncClient(["1. 1040\n2. 1040", good_json, rejected])
+
+    results = asyncio.run(extract_batch(["1040 form", "1040 form, page 2"], registry, llm_client, model="fake", max_concurrency=1))
+    assert results[0]["data"]["income"] == 1000
+    assert results[1] is rejected
+
+def test_extract_batch_falls_back_to_single_classification(registry):
+    good_json = json.dumps({"taxpayer_name": "John", "income": 1000})
+    llm_client = FakeAsyncClient(["1. unknown", "1040", good_json])
+
+    results = asyncio.run(extract_batch(["1040 form"], registry, llm_client, model="fake"))
+    assert results[0]["doc_type"] == "1040"
+    assert "classification_batch_size" not in results[0]["metrics"]
+
+def test_classify_documents_batches(registry):
+    """One LLM call per batch; numbered reply lines map back to documents."""
+    client = FakeClient(["1. w2\n2. 1040", "1. w2"])
+    metrics = {}
+    schema_ids = classify_documents(["W2", "1040", "W2 again"], registry, client, model="fake", batch_size=2, metrics=metrics)
+    assert schema_ids == ["w2", "1040", "w2"]
+    assert client.calls == 2
+    assert metrics["classification_batches"] == 2
+
+def test_classify_documents_unknown_schema(registry):
+    client = FakeClient("1. w2\n2. unknown_schema")
+    with pytest.raises(ExtractionError) as exc:
+        classify_documents(["W2", "Random text"], registry, client, model="fake")
+    assert "document 2" in str(exc.value)